@@ -1,20 +1,136 @@
-from functools import wraps
-from typing import Callable
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from enum import Enum, Flag
+from functools import update_wrapper
+
+_MISSING = object()
+
+
+def _takes_no_arguments(f: Callable) -> bool:
+    import inspect  # only needed at decoration time, keeps the package import cheap
+
+    try:
+        return not inspect.signature(f, follow_wrapped=False).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _make_callable_wrapper(
+    f: Callable,
+    identity_loader: Callable,
+    on_forbidden: Callable,
+    requirement: Callable,
+) -> Callable:
+    if _takes_no_arguments(f):
+
+        def wrapper():
+            if not requirement(identity_loader()):
+                return on_forbidden()
+            return f()
+
+        return wrapper
+
+    def wrapper(*args, **kwargs):
+        if not requirement(identity_loader()):
+            return on_forbidden()
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def _make_bitmask_wrapper(
+    f: Callable, identity_loader: Callable, on_forbidden: Callable, required_mask: int
+) -> Callable:
+    if _takes_no_arguments(f):
+
+        def wrapper():
+            if (
+                getattr(identity_loader(), "perm_mask", 0) & required_mask
+                != required_mask
+            ):
+                return on_forbidden()
+            return f()
+
+        return wrapper
+
+    def wrapper(*args, **kwargs):
+        if getattr(identity_loader(), "perm_mask", 0) & required_mask != required_mask:
+            return on_forbidden()
+        return f(*args, **kwargs)
+
+    return wrapper
 
 
 class Authorizer:
-    def __init__(self, identity_loader: Callable, on_forbidden: Callable) -> None:
+    def __init__(
+        self,
+        identity_loader: Callable,
+        on_forbidden: Callable,
+        lightweight: bool = False,
+        cache_identity: bool = False,
+    ) -> None:
         self._identity_loader = identity_loader
         self._on_forbidden = on_forbidden
+        self._lightweight = lightweight
+        self._identity_key = f"_authorization_hero_identity_{id(self)}"
+        if cache_identity:
+            try:
+                from flask import has_request_context, request
+            except ImportError as error:
+                raise ImportError("cache_identity=True requires Flask") from error
+            self._has_request_context = has_request_context
+            self._request = request
+            self._load_identity = self._load_cached_identity
+        else:
+            self._load_identity = identity_loader
+
+    def requires_permission(self, requirement: Callable | int) -> Callable:
+        if isinstance(requirement, int):
+            return self.requires_bitmask(requirement)
+        return self._decorator(_make_callable_wrapper, requirement)
+
+    def requires_bitmask(self, required_mask: int) -> Callable:
+        if isinstance(required_mask, bool) or (
+            isinstance(required_mask, Enum) and not isinstance(required_mask, Flag)
+        ):
+            raise ValueError(f"{required_mask!r} is not a permission mask")
+        if required_mask <= 0:
+            raise ValueError("A permission mask must require at least one bit")
+        return self._decorator(_make_bitmask_wrapper, int(required_mask))
 
-    def requires_permission(self, requirement: Callable) -> Callable:
+    def route(self, app, rule: str, requirement: Callable | int, **options) -> Callable:
         def decorator(f):
-            @wraps(f)
-            def wrapper(*args, **kwargs):
-                if not requirement(self._identity_loader()):
-                    return self._on_forbidden()
-                return f(*args, **kwargs)
+            return app.route(rule, **options)(self.requires_permission(requirement)(f))
 
-            return wrapper
+        return decorator
+
+    @staticmethod
+    def filter_allowed(masks: Iterable[int], required_mask: int) -> list[bool]:
+        """Allow masks that contain every bit of required_mask."""
+        required_mask = int(required_mask)
+        return [(mask & required_mask) == required_mask for mask in masks]
+
+    def _decorator(self, make_wrapper: Callable, check) -> Callable:
+        identity_loader = self._load_identity
+        on_forbidden = self._on_forbidden
+        lightweight = self._lightweight
+
+        def decorator(f):
+            wrapper = make_wrapper(f, identity_loader, on_forbidden, check)
+            if lightweight:
+                wrapper.__name__ = getattr(f, "__name__", wrapper.__name__)
+                return wrapper
+            return update_wrapper(wrapper, f)
 
         return decorator
+
+    def _load_cached_identity(self):
+        # flask.g lives on the app context, which several requests can share.
+        if not self._has_request_context():
+            return self._identity_loader()
+        identity = getattr(self._request, self._identity_key, _MISSING)
+        if identity is _MISSING:
+            identity = self._identity_loader()
+            setattr(self._request, self._identity_key, identity)
+        return identity
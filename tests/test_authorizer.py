@@ -1,76 +1,97 @@
-from enum import Enum, auto
+import inspect
+import sys
+from enum import IntEnum, IntFlag, auto
+from functools import partial, wraps
 
 import pytest
-from flask import Flask, abort
+from flask import Flask, abort, request
 
 from authorization_hero import Authorizer
 
 
-class AuthorizationGroup(Enum):
+class AuthorizationGroup(IntEnum):
     EMPLOYEE = auto()
     MANAGER = auto()
     ADMIN = auto()
 
 
-class Permissions(Enum):
+class Permissions(IntFlag):
     VIEW = auto()
     EDIT = auto()
     DELETE_PROJECT = auto()
 
 
+# Indexed by AuthorizationGroup - 1, so entries follow the enum order.
+_GROUP_TABLE: tuple[Permissions, ...] = (
+    Permissions.VIEW,
+    Permissions.VIEW | Permissions.EDIT,
+    Permissions.EDIT | Permissions.DELETE_PROJECT,
+)
+
+
 def get_authorization_group_permissions(
     authorization_group: AuthorizationGroup,
-) -> list[Permissions]:
+) -> Permissions:
     """Business logic for mapping AuthorizationGroup to Permissions comes here."""
-    return {
-        AuthorizationGroup.EMPLOYEE: [Permissions.VIEW],
-        AuthorizationGroup.MANAGER: [Permissions.VIEW, Permissions.EDIT],
-        AuthorizationGroup.ADMIN: [Permissions.EDIT, Permissions.DELETE_PROJECT],
-    }[authorization_group]
+    return _GROUP_TABLE[authorization_group - 1]
+
+
+# Plain ints, so checks on the hot path skip the IntFlag operators.
+_VIEW_BIT = Permissions.VIEW.value
+_EDIT_BIT = Permissions.EDIT.value
+_DELETE_BIT = Permissions.DELETE_PROJECT.value
+_ALL_BITS = _VIEW_BIT | _EDIT_BIT | _DELETE_BIT
 
 
 class User:
+    __slots__ = ("username", "authorization_groups", "perm_mask", "_permissions")
+
     def __init__(
-        self, username: str, authorization_groups: set[AuthorizationGroup]
+        self, username: str, authorization_groups: tuple[AuthorizationGroup, ...]
     ) -> None:
         self.username = username
         self.authorization_groups = authorization_groups
-
-    def permissions(self) -> set[Permissions]:
-        permissions = set()
-        for group_membership in self.authorization_groups:
-            permissions.update(get_authorization_group_permissions(group_membership))
-        return permissions
+        self.perm_mask = 0
+        for group_membership in authorization_groups:
+            self.perm_mask |= get_authorization_group_permissions(
+                group_membership
+            ).value
+            if self.perm_mask == _ALL_BITS:
+                break
+        self._permissions = Permissions(self.perm_mask)
+
+    @property
+    def permissions(self) -> Permissions:
+        return self._permissions
+
+
+_EMPLOYEE = User(
+    "Joe Test Employee",
+    (AuthorizationGroup.EMPLOYEE,),
+)
+_MANAGER = User(
+    "Alice Test Manager",
+    (AuthorizationGroup.MANAGER,),
+)
+_ADMIN = User(
+    "John Test Admin",
+    (AuthorizationGroup.ADMIN,),
+)
 
 
 def load_employee() -> User:
     """Load employee for testing purposes"""
-    return User(
-        "Joe Test Employee",
-        {
-            AuthorizationGroup.EMPLOYEE,
-        },
-    )
+    return _EMPLOYEE
 
 
 def load_manager() -> User:
     """Load manager for testing purposes"""
-    return User(
-        "Alice Test Manager",
-        {
-            AuthorizationGroup.MANAGER,
-        },
-    )
+    return _MANAGER
 
 
 def load_admin() -> User:
     """Load admin for testing purposes"""
-    return User(
-        "John Test Admin",
-        {
-            AuthorizationGroup.ADMIN,
-        },
-    )
+    return _ADMIN
 
 
 def forbidden() -> None:
@@ -78,15 +99,15 @@ def forbidden() -> None:
 
 
 def user_can_view(user: User) -> bool:
-    return Permissions.VIEW in user.permissions()
+    return bool(user.perm_mask & _VIEW_BIT)
 
 
 def user_can_edit(user: User) -> bool:
-    return Permissions.EDIT in user.permissions()
+    return bool(user.perm_mask & _EDIT_BIT)
 
 
 def user_can_delete_project(user: User) -> bool:
-    return Permissions.DELETE_PROJECT in user.permissions()
+    return bool(user.perm_mask & _DELETE_BIT)
 
 
 class TestAuthorizerEmployee:
@@ -292,6 +313,33 @@ class TestFunctionWithArguments:
         # AND the specified message is returned
         assert str(error.value) == "403 Forbidden"
 
+    def test_function_without_signature__allowed(self):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_employee, forbidden)
+
+        # AND a builtin function without an inspectable signature
+        guarded_max = authorizer.requires_permission(user_can_view)(max)
+
+        # WHEN the function is called
+        # THEN function can be run
+        assert guarded_max(1, 3, 2) == 3
+
+    def test_partial_function__lightweight(self):
+        # GIVEN a lightweight Authorizer instance
+        authorizer = Authorizer(load_employee, forbidden, lightweight=True)
+
+        # AND a partial function, which has no __name__
+        def greet_user(greeting: str, name: str):
+            return f"{greeting} {name}!"
+
+        greet = authorizer.requires_permission(user_can_view)(
+            partial(greet_user, "Hello")
+        )
+
+        # WHEN the function is called
+        # THEN function can be run
+        assert greet("John") == "Hello John!"
+
 
 class TestExoticConditions:
     def test_authorizer_with_exotic_conditions__allowed(self):
@@ -379,3 +427,342 @@ class TestAuthorizerFlask:
             response = client.get("/delete_project/23415/")
         assert response.status_code == 403
         assert b"Forbidden: you do not have access to this resource" in response.data
+
+    def test_home__lightweight(self):
+        # GIVEN a forbidden function
+        def flask_forbidden():
+            abort(403, "Forbidden: you do not have access to this resource")
+
+        # AND a Flask instance
+        app = Flask(__name__)
+        # AND a lightweight Authorizer
+        authorizer = Authorizer(load_employee, flask_forbidden, lightweight=True)
+
+        @app.route("/")
+        @authorizer.requires_permission(user_can_view)
+        def hello_world():
+            return "<p>Hello World!</p>"
+
+        # WHEN the home page is loaded
+        with app.test_client() as client:
+            response = client.get("/")
+        # THEN a 200 status is returned
+        assert response.status_code == 200
+        # AND the endpoint is registered under the name of the view
+        assert "hello_world" in app.view_functions
+        # AND the view is not introspectable through the wrapper
+        assert not hasattr(app.view_functions["hello_world"], "__wrapped__")
+
+    def test_cache_identity(self):
+        # GIVEN an identity loader that counts how often it is called
+        calls = []
+
+        def load_counted_employee():
+            calls.append(1)
+            return load_employee()
+
+        # AND a Flask instance
+        app = Flask(__name__)
+        # AND an Authorizer that caches the identity per request
+        authorizer = Authorizer(load_counted_employee, forbidden, cache_identity=True)
+
+        @authorizer.requires_permission(user_can_view)
+        def load_project(project_id: int):
+            return f"Project {project_id}"
+
+        @app.route("/compare/")
+        @authorizer.requires_permission(user_can_view)
+        def compare_projects():
+            return f"<p>{load_project(1)} vs {load_project(2)}</p>"
+
+        # WHEN the page is loaded twice
+        with app.test_client() as client:
+            client.get("/compare/")
+            response = client.get("/compare/")
+        # THEN a 200 status is returned
+        assert response.status_code == 200
+        # AND the identity is loaded once per request
+        assert len(calls) == 2
+
+    def test_cache_identity__shared_application_context(self):
+        # GIVEN a forbidden function
+        def flask_forbidden():
+            abort(403, "Forbidden: you do not have access to this resource")
+
+        # AND an identity loader that picks the user from a request header
+        def load_user_from_header():
+            return {"admin": _ADMIN, "employee": _EMPLOYEE}[request.headers["User"]]
+
+        # AND a Flask instance
+        app = Flask(__name__)
+        # AND an Authorizer that caches the identity per request
+        authorizer = Authorizer(
+            load_user_from_header, flask_forbidden, cache_identity=True
+        )
+
+        @app.route("/delete_project/<int:project_id>/")
+        @authorizer.requires_permission(Permissions.DELETE_PROJECT)
+        def delete_project(project_id: int):
+            return f"<p>Deleted project {project_id}</p>"
+
+        # WHEN an admin and then an employee send a request within one app context
+        with app.app_context(), app.test_client() as client:
+            admin_response = client.get(
+                "/delete_project/23415/", headers={"User": "admin"}
+            )
+            employee_response = client.get(
+                "/delete_project/23415/", headers={"User": "employee"}
+            )
+        # THEN the admin is allowed
+        assert admin_response.status_code == 200
+        # AND the employee is forbidden
+        assert employee_response.status_code == 403
+
+    def test_cache_identity__without_flask(self, monkeypatch):
+        # GIVEN that Flask cannot be imported
+        monkeypatch.setitem(sys.modules, "flask", None)
+
+        # WHEN an Authorizer that caches the identity per request is created
+        # THEN an ImportError is raised
+        with pytest.raises(ImportError) as error:
+            Authorizer(load_employee, forbidden, cache_identity=True)
+
+        # AND the specified message is returned
+        assert str(error.value) == "cache_identity=True requires Flask"
+
+    def test_cache_identity__outside_application_context(self):
+        # GIVEN an Authorizer that caches the identity per request
+        authorizer = Authorizer(load_employee, forbidden, cache_identity=True)
+
+        # AND a function that requires view permission
+        @authorizer.requires_permission(user_can_view)
+        def view_project():
+            return "Success"
+
+        # WHEN the function is called outside of a Flask application context
+        # THEN function can be run
+        assert view_project() == "Success"
+
+    def test_route(self):
+        # GIVEN a forbidden function
+        def flask_forbidden():
+            abort(403, "Forbidden: you do not have access to this resource")
+
+        # AND a Flask instance
+        app = Flask(__name__)
+        # AND an Authorizer
+        authorizer = Authorizer(load_employee, flask_forbidden)
+
+        @authorizer.route(app, "/", user_can_view)
+        def hello_world():
+            return "<p>Hello World!</p>"
+
+        @authorizer.route(
+            app,
+            "/delete_project/<int:project_id>/",
+            Permissions.DELETE_PROJECT,
+            methods=["POST"],
+        )
+        def delete_project(project_id: int):
+            return f"<p>Deleted project {project_id}</p>"
+
+        # WHEN the pages are loaded
+        with app.test_client() as client:
+            home_response = client.get("/")
+            delete_response = client.post("/delete_project/23415/")
+        # THEN the home page is returned
+        assert home_response.status_code == 200
+        assert home_response.data == b"<p>Hello World!</p>"
+        # AND deleting the project is forbidden
+        assert delete_response.status_code == 403
+
+    def test_stacked_decorator_with_url_argument(self):
+        # GIVEN a decorator that consumes the URL argument of a view without any
+        def with_project(f):
+            @wraps(f)
+            def wrapper(project_id: int):
+                return f()
+
+            return wrapper
+
+        # AND a Flask instance
+        app = Flask(__name__)
+        # AND an Authorizer
+        authorizer = Authorizer(load_employee, forbidden)
+
+        @app.route("/view_project/<int:project_id>/")
+        @authorizer.requires_permission(user_can_view)
+        @with_project
+        def view_project():
+            return "<p>Project</p>"
+
+        # WHEN the page is loaded
+        with app.test_client() as client:
+            response = client.get("/view_project/23415/")
+        # THEN a 200 status is returned
+        assert response.status_code == 200
+
+
+class TestUser:
+    def test_permissions__cached(self):
+        # GIVEN a manager
+        user = load_manager()
+
+        # WHEN the permissions are requested twice
+        # THEN the union of the group permissions is returned
+        assert user.permissions == Permissions.VIEW | Permissions.EDIT
+        assert Permissions.VIEW in user.permissions
+        assert Permissions.DELETE_PROJECT not in user.permissions
+        # AND it is only built once
+        assert user.permissions is user.permissions
+
+    def test_perm_mask__multiple_groups(self):
+        # GIVEN a user that is both an employee and an admin
+        user = User(
+            "Jane Test Employee Admin",
+            (AuthorizationGroup.EMPLOYEE, AuthorizationGroup.ADMIN),
+        )
+
+        # THEN the user has the permissions of both groups
+        assert user_can_view(user)
+        assert user_can_edit(user)
+        assert user_can_delete_project(user)
+
+
+class TestFilterAllowed:
+    def test_filter_allowed(self):
+        # GIVEN the permission bitmasks of a batch of users
+        masks = [user.perm_mask for user in (_EMPLOYEE, _MANAGER, _ADMIN)]
+
+        # WHEN the batch is filtered on edit permission
+        # THEN only the users with edit permission are allowed
+        assert Authorizer.filter_allowed(masks, _EDIT_BIT) == [False, True, True]
+
+    def test_filter_allowed__all_bits_required(self):
+        # GIVEN the permission bitmasks of a batch of users
+        masks = [user.perm_mask for user in (_EMPLOYEE, _MANAGER, _ADMIN)]
+
+        # WHEN the batch is filtered on view AND edit permission
+        # THEN only the users with both permissions are allowed
+        assert Authorizer.filter_allowed(masks, _VIEW_BIT | _EDIT_BIT) == [
+            False,
+            True,
+            False,
+        ]
+
+
+class TestRequiresBitmask:
+    def test_requires_bitmask__allowed(self):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_manager, forbidden)
+
+        # AND a function that requires the edit permission bit
+        @authorizer.requires_bitmask(_EDIT_BIT)
+        def edit_project(project_id: int):
+            return f"Edited project {project_id}"
+
+        # WHEN the function is called
+        # THEN function can be run
+        assert edit_project(23415) == "Edited project 23415"
+
+    def test_requires_bitmask__forbidden(self):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_employee, forbidden)
+
+        # AND a function that requires the edit permission bit
+        @authorizer.requires_bitmask(_EDIT_BIT)
+        def edit_project(project_id: int):
+            return f"Edited project {project_id}"
+
+        # WHEN the function is called
+        # THEN the forbidden function is run
+        with pytest.raises(PermissionError) as error:
+            edit_project(23415)
+
+        # AND the specified message is returned
+        assert str(error.value) == "403 Forbidden"
+
+    def test_requires_bitmask__anonymous_user(self):
+        # GIVEN an Authorizer instance with an identity loader for anonymous users
+        authorizer = Authorizer(lambda: None, forbidden)
+
+        # AND a function that requires the view permission bit
+        @authorizer.requires_bitmask(_VIEW_BIT)
+        def view_project():
+            return "Success"
+
+        # WHEN the function is called
+        # THEN the forbidden function is run
+        with pytest.raises(PermissionError) as error:
+            view_project()
+
+        # AND the specified message is returned
+        assert str(error.value) == "403 Forbidden"
+
+    def test_requires_bitmask__all_bits_required(self):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_admin, forbidden)
+
+        # AND a function that requires both the view and edit permission bits
+        @authorizer.requires_bitmask(_VIEW_BIT | _EDIT_BIT)
+        def edit_project():
+            return "Success"
+
+        # WHEN the function is called by a user with only one of the bits
+        # THEN the forbidden function is run
+        with pytest.raises(PermissionError) as error:
+            edit_project()
+
+        # AND the specified message is returned
+        assert str(error.value) == "403 Forbidden"
+
+    def test_requires_permission__bitmask(self):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_employee, forbidden)
+
+        # AND functions that require a permission flag instead of a function
+        @authorizer.requires_permission(Permissions.VIEW)
+        def view_project():
+            return "Success"
+
+        @authorizer.requires_permission(Permissions.DELETE_PROJECT)
+        def delete_project():
+            return "Success"
+
+        # WHEN the functions are called
+        # THEN the function with a granted bit can be run
+        assert view_project() == "Success"
+        # AND the forbidden function is run for the other one
+        with pytest.raises(PermissionError):
+            delete_project()
+
+    def test_requires_bitmask__no_arguments(self):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_employee, forbidden)
+
+        # AND a function without parameters that requires the delete permission bit
+        @authorizer.requires_bitmask(_DELETE_BIT)
+        def delete_project():
+            return "Success"
+
+        # WHEN the wrapper is inspected
+        # THEN it takes no arguments either
+        assert not inspect.signature(delete_project, follow_wrapped=False).parameters
+        # AND calling it runs the forbidden function
+        with pytest.raises(PermissionError):
+            delete_project()
+
+    @pytest.mark.parametrize(
+        "required_mask", [0, -1, Permissions(0), True, AuthorizationGroup.ADMIN]
+    )
+    def test_requires_bitmask__invalid_mask(self, required_mask):
+        # GIVEN an Authorizer instance
+        authorizer = Authorizer(load_employee, forbidden)
+
+        # WHEN a requirement that is not a valid permission mask is used
+        # THEN a ValueError is raised at decoration time
+        with pytest.raises(ValueError):
+            authorizer.requires_bitmask(required_mask)
+        # AND also when it is passed to requires_permission
+        with pytest.raises(ValueError):
+            authorizer.requires_permission(required_mask)